@@ -4,13 +4,15 @@ import os
 import glob
 import re
 import random
+from collections import deque
+from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import StaleElementReferenceException
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
 # -----------------------------
@@ -57,10 +59,187 @@ FILES_TO_PROCESS = [{"input": f} for f in excel_files]
 options = Options()
 options.add_argument("--start-maximized")
 
-driver = webdriver.Chrome(
-    service=Service(ChromeDriverManager().install()),
-    options=options
-)
+def create_driver():
+    return webdriver.Chrome(
+        service=Service(ChromeDriverManager().install()),
+        options=options
+    )
+
+driver = create_driver()
+
+
+# -----------------------------
+# Throttle Detection & Circuit Breaker
+# -----------------------------
+# Google sometimes answers with a consent page, an "unusual traffic" page, or
+# simply stops producing output. Instead of burning retries and writing source
+# text row after row, we open a breaker, cool down, and resume the same rows.
+BREAKER_BASE_COOLDOWN = 60       # seconds, doubled on every consecutive trip
+BREAKER_MAX_COOLDOWN = 15 * 60   # cap for the exponential cooldown
+BREAKER_RESTART_AFTER = 2        # consecutive trips before starting a fresh browser
+BREAKER_MAX_TRIPS = 6            # consecutive trips before giving up on the run
+MAX_ROW_REQUEUES = 2             # streak/error-rate requeues before a row is left for a later run
+SUSPECT_STREAK_LIMIT = 3         # consecutive failed/unchanged rows before tripping
+ERROR_WINDOW = 20                # rows considered for the error rate
+ERROR_RATE_THRESHOLD = 0.5       # failure ratio in the window that trips the breaker
+ERROR_RATE_MIN_SAMPLES = 10
+
+CONSENT_REASON = "consent page"
+BLOCK_URL_MARKERS = {
+    "consent.google.": CONSENT_REASON,
+    "google.com/sorry": "unusual traffic page",
+}
+# Only checked when the translator textarea is missing, so text typed into
+# Translate can never match these
+BLOCK_TEXT_MARKERS = {
+    "our systems have detected unusual traffic from your computer network": "unusual traffic page",
+    "this page checks to see if it's really you sending the requests": "captcha",
+    "before you continue to google": CONSENT_REASON,
+}
+OUTPUT_SELECTOR = "span[jsname='W297wb']"
+PROBE_TEXT = "Hello"
+
+breaker = {
+    "consecutive_trips": 0,
+    "suspect_rows": [],                       # row indices of the current suspect streak
+    "outcomes": deque(maxlen=ERROR_WINDOW),   # (row index, True if clean / False if failed)
+    "last_source": None,                      # normalized source of the previous row
+}
+
+
+def normalize_source(text):
+    return str(text).strip().casefold()
+
+
+def output_text(d):
+    elms = d.find_elements(By.CSS_SELECTOR, OUTPUT_SELECTOR)
+    return elms[0].text.strip() if elms else ""
+
+
+# Smart Wait: the output element is present AND has text (length > 0)
+def output_has_text(d):
+    text = output_text(d)
+    return len(text) > 0 and text != "Translating..."
+
+
+def log_breaker(event, detail):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] ⚡ BREAKER {event}: {detail}")
+
+
+def detect_block_page(d):
+    """Return a reason string if the browser is on a throttle/consent page, else None."""
+    try:
+        current_url = d.current_url.lower()
+        for marker, reason in BLOCK_URL_MARKERS.items():
+            if marker in current_url:
+                return reason
+        # A working translator page is never a block page; skip serializing the DOM
+        if d.find_elements(By.TAG_NAME, "textarea"):
+            return None
+        page_source = d.page_source.lower()
+    except Exception:
+        return None
+    for marker, reason in BLOCK_TEXT_MARKERS.items():
+        if marker in page_source:
+            return reason
+    return None
+
+
+def record_row_outcome(i, ok):
+    """Track a finished row and return a trip reason if throttling is suspected."""
+    breaker["outcomes"].append((i, ok))
+    if ok:
+        breaker["suspect_rows"].clear()
+        breaker["consecutive_trips"] = 0
+        return None
+
+    breaker["suspect_rows"].append(i)
+    if len(breaker["suspect_rows"]) >= SUSPECT_STREAK_LIMIT:
+        return f"{len(breaker['suspect_rows'])} consecutive empty/unchanged outputs"
+
+    outcomes = breaker["outcomes"]
+    if len(outcomes) >= ERROR_RATE_MIN_SAMPLES:
+        error_rate = sum(not row_ok for _, row_ok in outcomes) / len(outcomes)
+        if error_rate >= ERROR_RATE_THRESHOLD:
+            return f"error rate {error_rate:.0%} over last {len(outcomes)} rows"
+    return None
+
+
+def failed_rows_in_window():
+    """Failed rows still in the error window, oldest first, without duplicates."""
+    return list(dict.fromkeys(r for r, ok in breaker["outcomes"] if not ok))
+
+
+def abort_on_consent(reason):
+    """A cooldown never clears a consent interstitial, so stop instead of waiting."""
+    if reason == CONSENT_REASON:
+        log_breaker("ABORT", "Google is showing a consent page")
+        raise RuntimeError(
+            "Google is showing a consent page, which a cooldown cannot clear. "
+            "Accept it in Chrome, then rerun in RESUME mode."
+        )
+
+
+def probe_translator(d):
+    """Translate a short known string; return None if it works, else a reason."""
+    reason = detect_block_page(d)
+    if reason:
+        return reason
+    try:
+        input_box = WebDriverWait(d, 10).until(
+            EC.presence_of_element_located((By.TAG_NAME, "textarea"))
+        )
+        input_box.clear()
+        input_box.send_keys(PROBE_TEXT)
+        WebDriverWait(d, 15).until(output_has_text)
+        input_box.clear()
+    except Exception as e:
+        return detect_block_page(d) or f"probe translation failed: {type(e).__name__}"
+    return None
+
+
+def open_breaker(reason, url):
+    """Pause until Google translates again. Blocks; consumes no rows.
+
+    Raises RuntimeError after BREAKER_MAX_TRIPS consecutive trips. Callers
+    save progress before opening the breaker.
+    """
+    global driver
+    while True:
+        breaker["consecutive_trips"] += 1
+        trips = breaker["consecutive_trips"]
+        if trips > BREAKER_MAX_TRIPS:
+            log_breaker("GIVE UP", f"{reason} after {BREAKER_MAX_TRIPS} consecutive trips")
+            raise RuntimeError(f"Translator unavailable: {reason}")
+        cooldown = min(BREAKER_BASE_COOLDOWN * 2 ** (trips - 1), BREAKER_MAX_COOLDOWN)
+        cooldown += random.uniform(0, cooldown * 0.1)
+        log_breaker("OPEN", f"{reason} (trip #{trips}, cooling down {cooldown:.0f}s)")
+        time.sleep(cooldown)
+
+        if trips % BREAKER_RESTART_AFTER == 0:
+            # Hand the work to a fresh browser session (new cookies, new worker)
+            log_breaker("RESTART", "starting a fresh browser session")
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            driver = create_driver()
+
+        log_breaker("HALF-OPEN", "probing translator page")
+        try:
+            driver.get(url)
+            time.sleep(5)
+            reason = probe_translator(driver)
+        except Exception as e:
+            reason = f"probe failed: {type(e).__name__}"
+        abort_on_consent(reason)
+
+        if reason is None:
+            breaker["outcomes"].clear()
+            breaker["last_source"] = None
+            log_breaker("CLOSED", "probe translation succeeded, resuming")
+            return
 
 # Deduplicate FILES_TO_PROCESS
 seen_inputs = set()
@@ -216,6 +395,8 @@ try:
         url = f"https://translate.google.com/?sl=en&tl={tl_param}&op=translate"
         driver.get(url)
         time.sleep(5)
+        abort_on_consent(detect_block_page(driver))
+        breaker["last_source"] = None
 
         translations = []
         current_target_data = df[target_col].tolist()
@@ -224,11 +405,15 @@ try:
         SAVE_INTERVAL = 10
         changes_since_save = 0
         
-        for i in range(total_rows):
-            # If this row wasn't marked for processing, skip it (it's either done or empty)
-            if i not in rows_to_process:
-                continue
-            
+        # Work queue: rows are only removed once they are finished, so rows
+        # caught in a throttle streak can be pushed back while the breaker is open.
+        # Failed rows keep their original target value, so Fill Missing or
+        # Resume picks them up again if they are not retried here.
+        pending_rows = deque(rows_to_process)
+        requeue_counts = {}
+        
+        while pending_rows:
+            i = pending_rows.popleft()
             source_text = df.at[i, source_col]
             
             # Random delay to mimic human behavior and avoid rate limits
@@ -238,32 +423,40 @@ try:
             max_retries = 3
             translated_text = None
             
+            throttle_reason = None
+            row_ok = False
+            
             for attempt in range(max_retries):
                 try:
+                    # Bail out early instead of burning retries on a block page
+                    throttle_reason = detect_block_page(driver)
+                    if throttle_reason:
+                        break
+
                     # Wait for input box to be present and interactable
                     input_box = WebDriverWait(driver, 10).until(
                         EC.presence_of_element_located((By.TAG_NAME, "textarea"))
                     )
+                    previous_text = output_text(driver)
                     input_box.clear()
                     
                     # Small wait after clear to let UI catch up
                     time.sleep(0.5)
                     
+                    # A responsive page empties the output once the input is cleared
+                    try:
+                        WebDriverWait(driver, 2).until(lambda d: output_text(d) == "")
+                        output_cleared = True
+                    except TimeoutException:
+                        output_cleared = False
+                    
                     input_box.send_keys(str(source_text))
 
-                    # Smart Wait: Wait until the output element is present AND has text (length > 0)
-                    def output_has_text(d):
-                        elms = d.find_elements(By.CSS_SELECTOR, "span[jsname='W297wb']")
-                        if not elms:
-                            return False
-                        elm = elms[0]
-                        return len(elm.text.strip()) > 0 and elm.text.strip() != "Translating..."
-
                     WebDriverWait(driver, 15).until(output_has_text)
                     
                     # Stability Check: Ensure text doesn't change for a moment (handling ongoing translation)
                     # We start with a baseline text
-                    output_element = driver.find_element(By.CSS_SELECTOR, "span[jsname='W297wb']")
+                    output_element = driver.find_element(By.CSS_SELECTOR, OUTPUT_SELECTOR)
                     current_text = output_element.text
                     
                     # Verify stability for up to 5 seconds
@@ -274,7 +467,7 @@ try:
                         time.sleep(0.5)
                         try:
                             # Re-fetch element to avoid staleness
-                            new_element = driver.find_element(By.CSS_SELECTOR, "span[jsname='W297wb']")
+                            new_element = driver.find_element(By.CSS_SELECTOR, OUTPUT_SELECTOR)
                             new_text = new_element.text
                             
                             if new_text == current_text and new_text.strip() != "":
@@ -291,6 +484,25 @@ try:
                          # If we timed out waiting for stability, just take what we have
                         translated_text = current_text
                     
+                    # An output that never cleared and still shows the previous
+                    # text for a different source means the page stopped
+                    # translating (typical of soft throttling). Near-duplicate
+                    # sources like "Sign in" / "Sign In" are not flagged.
+                    source_key = normalize_source(source_text)
+                    row_ok = not (
+                        not output_cleared
+                        and translated_text.strip() == previous_text
+                        and source_key != breaker["last_source"]
+                    )
+                    if not row_ok:
+                        # Never accept stale text; retry like any failed attempt
+                        print(f"⚠️ {i+1}/{total_rows} output unchanged from previous row (attempt {attempt+1})")
+                        if attempt < max_retries - 1:
+                            time.sleep(1)
+                            continue
+                        break
+                    breaker["last_source"] = source_key
+                    
                     # If we got here, success
                     # Update our local list (which mimics the column)
                     current_target_data[i] = translated_text
@@ -322,12 +534,48 @@ try:
                                 s_df.to_excel(writer, sheet_name=s_name, index=False)
                         raise e # Re-raise to exit the loop/script
 
+                    throttle_reason = detect_block_page(driver)
+                    if throttle_reason:
+                        break
+
                     if attempt < max_retries - 1:
                         time.sleep(1) # Wait a bit before retrying
                         continue
                     else:
-                        print(f"✖ Error at line {i+1} after {max_retries} attempts: {e}")
-                        current_target_data[i] = source_text
+                        print(f"✖ Error at line {i+1} after {max_retries} attempts, leaving it untranslated: {e}")
+
+            if not throttle_reason:
+                throttle_reason = record_row_outcome(i, row_ok)
+                if throttle_reason:
+                    # Streak or error-rate trip: retry every failed row in the
+                    # window, but only a bounded number of times per row
+                    retry_rows = []
+                    for r in failed_rows_in_window():
+                        requeue_counts[r] = requeue_counts.get(r, 0) + 1
+                        if requeue_counts[r] > MAX_ROW_REQUEUES:
+                            # Keeps failing after cooldowns: leave it for a later run
+                            print(f"✖ Giving up on line {r+1} after {MAX_ROW_REQUEUES} requeues, leaving it untranslated")
+                        else:
+                            retry_rows.append(r)
+                else:
+                    retry_rows = []
+            else:
+                # Blocked before this row finished: it was never consumed.
+                # Block pages are throttling by definition, so this is not counted.
+                retry_rows = [r for r in failed_rows_in_window() if r != i] + [i]
+
+            if throttle_reason:
+                pending_rows.extendleft(reversed(retry_rows))
+                breaker["suspect_rows"].clear()
+
+                # Save progress before a potentially long cooldown (or giving up)
+                with pd.ExcelWriter(output_excel, engine='openpyxl') as writer:
+                    for s_name, s_df in all_sheets.items():
+                        s_df.to_excel(writer, sheet_name=s_name, index=False)
+                changes_since_save = 0
+
+                abort_on_consent(throttle_reason)
+                open_breaker(throttle_reason, url)
 
         df[target_col] = current_target_data
         df["Has Translation"] = "Yes"